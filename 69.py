@@ -1,98 +1,184 @@
 import streamlit as st
 import hashlib
+import itertools
 import json
+import numpy as np
+import struct
+import sys
+import threading
 import time
 import uuid
 
 # ---------------- Blockchain Classes ----------------
+# Ticket status codes stored in TicketBlockchain.statuses
+VALID, REDEEMED = 0, 1
+STATUS_NAMES = ("valid", "redeemed")
+
 class TicketTransaction:
-    def __init__(self, tx_type, ticket_id, owner, event=None, new_owner=None):
+    __slots__ = ("tx_type", "ticket_id", "owner", "event", "new_owner", "timestamp", "_canonical")
+    def __init__(self, tx_type, ticket_id, owner, event=None, new_owner=None, ts=None):
         self.tx_type = tx_type
         self.ticket_id = ticket_id
-        self.owner = owner
+        # Owner names recur across many transactions, so keep one shared copy of each
+        self.owner = sys.intern(owner)
         self.event = event
-        self.new_owner = new_owner
-        self.timestamp = time.time()
+        self.new_owner = None if new_owner is None else sys.intern(new_owner)
+        self.timestamp = time.time() if ts is None else ts
+        # Fixed field order, so only a nested event dict needs its keys sorted.
+        key = (tx_type, ticket_id, self.owner, event, self.new_owner, self.timestamp)
+        self._canonical = json.dumps(key, sort_keys=True, separators=(",", ":")).encode()
     def to_dict(self):
-        return self.__dict__
+        return {
+            "tx_type": self.tx_type,
+            "ticket_id": self.ticket_id,
+            "owner": self.owner,
+            "event": self.event,
+            "new_owner": self.new_owner,
+            "timestamp": self.timestamp
+        }
 
 class Block:
-    def __init__(self, index, transactions, previous_hash, nonce=0):
+    nonce_format = struct.Struct("<Q")
+    def __init__(self, index, transactions, previous_hash, nonce=0, ts=None):
         self.index = index
         self.transactions = transactions
-        self.timestamp = time.time()
+        self.timestamp = time.time() if ts is None else ts
         self.previous_hash = previous_hash
         self.nonce = nonce
+        self.merkle_root = self.compute_merkle_root()
+        # Ledger view payload; a block's transactions never change once it is built
+        self.display = json.dumps([tx.to_dict() for tx in transactions], separators=(",", ":"))
+    def compute_merkle_root(self):
+        level = [hashlib.sha256(tx._canonical).digest() for tx in self.transactions]
+        if not level:
+            return bytes(32)
+        while len(level) > 1:
+            if len(level) % 2:
+                level.append(level[-1])
+            # Each layer is hashed straight out of one buffer of 64-byte sibling pairs.
+            pairs = memoryview(b"".join(level))
+            level = [hashlib.sha256(pairs[i:i + 64]).digest() for i in range(0, len(pairs), 64)]
+        return level[0]
+    def compute_prefix(self):
+        return struct.pack("<Id32s32s", self.index, self.timestamp,
+                           bytes.fromhex(self.previous_hash.zfill(64)), self.merkle_root)
     def compute_hash(self):
-        block_string = json.dumps({
-            "index": self.index,
-            "transactions": [tx.to_dict() for tx in self.transactions],
-            "timestamp": self.timestamp,
-            "previous_hash": self.previous_hash,
-            "nonce": self.nonce
-        }, sort_keys=True).encode()
-        return hashlib.sha256(block_string).hexdigest()
+        return hashlib.sha256(self.compute_prefix() + self.nonce_format.pack(self.nonce)).hexdigest()
 
 class TicketBlockchain:
     difficulty = 2
+    targets = {}
     def __init__(self):
         self.chain = []
         self.pending_transactions = []
-        self.tickets = {}
+        # Tickets are kept column-wise; row i describes ticket_ids[i].
+        self.ticket_ids = []
+        self.id_to_idx = {}
+        self.owners = []
+        self.events = []
+        self.statuses = np.zeros(16, dtype=np.uint8)
+        self.valid_ticket_ids = {}  # insertion-ordered set of ticket ids
+        self.lock = threading.Lock()
+        self._first_pending = None
         self.create_genesis_block()
     def create_genesis_block(self):
         genesis_block = Block(0, [], "0")
         genesis_block.hash = genesis_block.compute_hash()
         self.chain.append(genesis_block)
     def add_transaction(self, transaction):
+        if not self.pending_transactions:
+            self._first_pending = time.time()
         self.pending_transactions.append(transaction)
     def mine(self):
-        if not self.pending_transactions:
-            return None
-        new_block = Block(len(self.chain), self.pending_transactions, self.chain[-1].compute_hash())
-        new_block.hash = self.proof_of_work(new_block)
-        self.chain.append(new_block)
-        self.pending_transactions = []
-        return new_block
+        with self.lock:
+            if not self.pending_transactions:
+                return None
+            new_block = Block(len(self.chain), self.pending_transactions, self.chain[-1].hash)
+            new_block.hash = self.proof_of_work(new_block)
+            self.chain.append(new_block)
+            self.pending_transactions = []
+            self._first_pending = None
+            return new_block
+    def maybe_mine(self, threshold=8, max_wait=5):
+        # Batch transactions into fewer blocks: only mine once enough are
+        # pending or the oldest pending one has waited more than max_wait.
+        first_pending = self._first_pending
+        if len(self.pending_transactions) >= threshold or (
+                first_pending is not None and time.time() - first_pending > max_wait):
+            return self.mine()
+        return None
     def proof_of_work(self, block):
-        block.nonce = 0
-        computed_hash = block.compute_hash()
-        while not computed_hash.startswith("0" * self.difficulty):
-            block.nonce += 1
-            computed_hash = block.compute_hash()
-        return computed_hash
+        # Everything but the nonce is fixed while mining, so hash it once
+        # and resume from a copy of that state for each attempt.
+        midstate = hashlib.sha256(block.compute_prefix())
+        resume = midstate.copy
+        pack_nonce = block.nonce_format.pack
+        target = self.target_for(self.difficulty)
+        for nonce in itertools.count():
+            attempt = resume()
+            attempt.update(pack_nonce(nonce))
+            digest = attempt.digest()
+            if digest <= target:
+                block.nonce = nonce
+                return digest.hex()
+    @classmethod
+    def target_for(cls, difficulty):
+        # A digest starts with `difficulty` zero hex digits exactly when it is
+        # at most this big-endian bound, so the check is a single bytes compare.
+        target = cls.targets.get(difficulty)
+        if target is None:
+            target = cls.targets[difficulty] = (16 ** (64 - difficulty) - 1).to_bytes(32, "big")
+        return target
     def issue_ticket(self, owner, event):
-        ticket_id = str(uuid.uuid4())
-        tx = TicketTransaction("issue", ticket_id, owner, event)
-        self.add_transaction(tx)
-        self.tickets[ticket_id] = {"owner": owner, "status": "valid", "event": event}
-        return ticket_id
+        with self.lock:
+            ticket_id = str(uuid.uuid4())
+            tx = TicketTransaction("issue", ticket_id, owner, event)
+            self.add_transaction(tx)
+            self.add_ticket(ticket_id, tx.owner, event)
+            return ticket_id
+    def add_ticket(self, ticket_id, owner, event):
+        idx = len(self.ticket_ids)
+        if idx == len(self.statuses):
+            self.statuses = np.concatenate([self.statuses, np.zeros_like(self.statuses)])
+        self.statuses[idx] = VALID
+        self.id_to_idx[ticket_id] = idx
+        self.ticket_ids.append(ticket_id)
+        self.owners.append(owner)
+        self.events.append(event)
+        self.valid_ticket_ids[ticket_id] = None
     def transfer_ticket(self, ticket_id, new_owner):
-        ticket = self.tickets.get(ticket_id)
-        if not ticket or ticket["status"] != "valid":
-            return False
-        tx = TicketTransaction("transfer", ticket_id, ticket["owner"], new_owner=new_owner)
-        self.add_transaction(tx)
-        ticket["owner"] = new_owner
-        return True
+        with self.lock:
+            idx = self.id_to_idx.get(ticket_id)
+            if idx is None or self.statuses[idx] != VALID:
+                return False
+            tx = TicketTransaction("transfer", ticket_id, self.owners[idx], new_owner=new_owner)
+            self.add_transaction(tx)
+            self.owners[idx] = tx.new_owner
+            return True
     def redeem_ticket(self, ticket_id):
-        ticket = self.tickets.get(ticket_id)
-        if not ticket or ticket["status"] != "valid":
-            return False
-        tx = TicketTransaction("redeem", ticket_id, ticket["owner"])
-        self.add_transaction(tx)
-        ticket["status"] = "redeemed"
-        return True
+        with self.lock:
+            idx = self.id_to_idx.get(ticket_id)
+            if idx is None or self.statuses[idx] != VALID:
+                return False
+            tx = TicketTransaction("redeem", ticket_id, self.owners[idx])
+            self.add_transaction(tx)
+            self.statuses[idx] = REDEEMED
+            del self.valid_ticket_ids[ticket_id]
+            return True
     def verify_ticket(self, ticket_id):
-        return self.tickets.get(ticket_id, None)
+        idx = self.id_to_idx.get(ticket_id)
+        if idx is None:
+            return None
+        return {"owner": self.owners[idx], "status": STATUS_NAMES[self.statuses[idx]], "event": self.events[idx]}
 
 # ---------------- Streamlit App ----------------
 st.set_page_config(page_title="Blockchain Ticketing System", layout="wide")
 st.title("🎫 Blockchain Ticketing System")
 
-# ---------------- Initialize session_state safely ----------------
-if "blockchain" not in st.session_state:
-    st.session_state.blockchain = TicketBlockchain()
+# ---------------- Shared blockchain (one per process) ----------------
+@st.cache_resource
+def get_chain():
+    chain = TicketBlockchain()
     # ---------- Preload demo tickets ----------
     demo_tickets = [
         ("Alice", "Concert A"),
@@ -100,9 +186,13 @@ if "blockchain" not in st.session_state:
         ("Charlie", "Sports Event C")
     ]
     for owner, event in demo_tickets:
-        ticket_id = st.session_state.blockchain.issue_ticket(owner, event)
-    st.session_state.blockchain.mine()
+        chain.issue_ticket(owner, event)
+    chain.mine()
+    return chain
+
+blockchain = get_chain()
 
+# ---------------- Initialize session_state safely ----------------
 if "issue_owner" not in st.session_state:
     st.session_state.issue_owner = ""
 if "issue_event" not in st.session_state:
@@ -116,8 +206,6 @@ if "redeem_select" not in st.session_state:
 if "verify_select" not in st.session_state:
     st.session_state.verify_select = None
 
-blockchain = st.session_state.blockchain
-
 # ---------------- Issue Ticket ----------------
 st.subheader("Issue Ticket")
 owner = st.text_input("Owner Name", key="issue_owner")
@@ -125,15 +213,16 @@ event_name = st.text_input("Event Name", key="issue_event")
 if st.button("Issue Ticket"):
     if owner and event_name:
         ticket_id = blockchain.issue_ticket(owner, event_name)
-        blockchain.mine()
+        blockchain.maybe_mine()
         st.success(f"Ticket issued! Ticket ID: {ticket_id}")
         st.button("Copy Ticket ID", on_click=lambda tid=ticket_id: st.experimental_set_clipboard(tid))
     else:
         st.warning("Please enter Owner and Event Name.")
 
 # ---------------- Dropdown lists ----------------
-valid_tickets = [tid for tid, t in blockchain.tickets.items() if t["status"] == "valid"]
-all_tickets = list(blockchain.tickets.keys())
+with blockchain.lock:
+    valid_tickets = list(blockchain.valid_ticket_ids)
+    all_tickets = list(blockchain.ticket_ids)
 
 # ---------------- Transfer Ticket ----------------
 st.subheader("Transfer Ticket")
@@ -143,7 +232,7 @@ if valid_tickets:
     if st.button("Transfer Ticket"):
         if new_owner:
             blockchain.transfer_ticket(transfer_ticket_id, new_owner)
-            blockchain.mine()
+            blockchain.maybe_mine()
             st.success(f"Ticket {transfer_ticket_id} transferred to {new_owner}.")
         else:
             st.warning("Enter a new owner name.")
@@ -156,7 +245,7 @@ if valid_tickets:
     redeem_ticket_id = st.selectbox("Select Ticket to Redeem", valid_tickets, key="redeem_select")
     if st.button("Redeem Ticket"):
         blockchain.redeem_ticket(redeem_ticket_id)
-        blockchain.mine()
+        blockchain.maybe_mine()
         st.success(f"Ticket {redeem_ticket_id} redeemed successfully.")
 else:
     st.info("No valid tickets available to redeem.")
@@ -178,6 +267,13 @@ else:
 
 # ---------------- View Blockchain ----------------
 st.subheader("Blockchain Ledger")
+if st.button("Seal Block"):
+    sealed = blockchain.mine()
+    if sealed:
+        st.success(f"Block {sealed.index} sealed with {len(sealed.transactions)} transaction(s).")
+    else:
+        st.info("No pending transactions to seal.")
+st.write(f"Pending transactions: {len(blockchain.pending_transactions)}")
 for block in blockchain.chain:
     st.write(f"Block Index: {block.index}, Previous Hash: {block.previous_hash}")
-    st.json([tx.to_dict() for tx in block.transactions])
+    st.json(block.display)